@@ -3,11 +3,20 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import streamlit as st
-import pandas as pd
 import json
 import io
+import csv
+import math
+import time
+from datetime import datetime
+
+# orjson serializes straight to UTF-8 bytes; stdlib json is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from flashcard_generator import FlashcardGenerator
-from utils import extract_text_from_pdf, validate_file_type
+from utils import extract_text_from_pdf, transform_fields_bulk, validate_file_type
 from database import DatabaseManager
 
 # Initialize the flashcard generator
@@ -20,6 +29,45 @@ def get_flashcard_generator():
 def get_database_manager():
     return DatabaseManager()
 
+# Cache read-only queries; writes clear these so every session sees fresh data
+@st.cache_data(ttl=60)
+def get_cached_flashcard_sets(_db):
+    return _db.get_all_flashcard_sets()
+
+@st.cache_data(ttl=60)
+def get_cached_statistics(_db):
+    return _db.get_statistics()
+
+def invalidate_flashcard_caches():
+    get_cached_flashcard_sets.clear()
+    get_cached_statistics.clear()
+
+# Re-uploads and reruns with the same PDF bytes skip re-parsing; bounded since
+# the cache is process-wide and every distinct upload would otherwise stay in memory
+@st.cache_data(show_spinner=False, max_entries=16, ttl=3600)
+def extract_pdf_text_cached(file_bytes: bytes) -> str:
+    return extract_text_from_pdf(io.BytesIO(file_bytes))
+
+# Generated cards shown per page; keeps per-rerun widget count bounded
+CARDS_PER_PAGE = 5
+
+# How long a successful API probe is trusted before re-checking
+API_STATUS_TTL_SECONDS = 120
+
+def check_api_connection(generator):
+    """Return the cached API probe result, re-testing the connection once it has expired"""
+    cached = st.session_state.get('api_status')
+    if cached and time.time() - cached[2] < API_STATUS_TTL_SECONDS:
+        return cached[0], cached[1]
+    
+    is_working, message = generator.test_api_connection()
+    # Failures are re-probed on the next click so a transient error doesn't pin demo mode
+    if is_working:
+        st.session_state.api_status = (is_working, message, time.time())
+    else:
+        st.session_state.pop('api_status', None)
+    return is_working, message
+
 def main():
     st.title("🎓 AI Flashcard Generator")
     st.markdown("Transform your educational content into interactive flashcards using AI")
@@ -27,8 +75,6 @@ def main():
     # Initialize session state
     if 'flashcards' not in st.session_state:
         st.session_state.flashcards = []
-    if 'edited_flashcards' not in st.session_state:
-        st.session_state.edited_flashcards = []
     if 'current_set_id' not in st.session_state:
         st.session_state.current_set_id = None
     
@@ -98,7 +144,8 @@ def generate_flashcards_tab(generator, db):
             if validate_file_type(uploaded_file):
                 try:
                     if uploaded_file.type == "application/pdf":
-                        st.session_state.content = extract_text_from_pdf(uploaded_file)
+                        # getvalue() returns the full upload regardless of the stream position
+                        st.session_state.content = extract_pdf_text_cached(uploaded_file.getvalue())
                         st.success(f"PDF processed successfully! Extracted {len(st.session_state.content)} characters.")
                     else:
                         st.session_state.content = str(uploaded_file.read(), "utf-8")
@@ -138,7 +185,7 @@ def generate_flashcards_tab(generator, db):
             st.warning("Please provide more content (at least 50 characters) for better flashcard generation.")
         else:
             generator = get_flashcard_generator()
-            is_api_working, api_message = generator.test_api_connection()
+            is_api_working, api_message = check_api_connection(generator)
             
             if not is_api_working:
                 st.warning(f"API Issue: {api_message}")
@@ -158,28 +205,40 @@ def generate_flashcards_tab(generator, db):
                             difficulty=difficulty
                         )
                     else:
-                        flashcards = generator.generate_flashcards(
+                        # Show each card's question as it arrives; the full deck renders below once done
+                        flashcards = []
+                        preview = st.empty()
+                        for flashcard in generator.stream_flashcards(
                             content=content,
                             subject=subject,
                             num_flashcards=num_flashcards,
                             difficulty=difficulty
-                        )
+                        ):
+                            flashcards.append(flashcard)
+                            preview.markdown("\n".join(
+                                f"{i}. {card['question']}" for i, card in enumerate(flashcards, start=1)
+                            ))
+                        preview.empty()
                     
                     if flashcards:
                         st.session_state.flashcards = flashcards
-                        st.session_state.edited_flashcards = flashcards.copy()
                         success_message = f"Successfully generated {len(flashcards)} flashcards!"
                         if use_demo_mode:
                             success_message += " (Demo Mode)"
                         st.success(success_message)
+                        if len(flashcards) < num_flashcards:
+                            st.warning(f"Only {len(flashcards)} of the {num_flashcards} requested flashcards were generated. Try adding more content or generating again.")
                     else:
                         st.error("Failed to generate flashcards. Please try again.")
                         
                 except Exception as e:
                     error_msg = str(e)
                     if "invalid_api_key" in error_msg or "401" in error_msg:
+                        # Re-probe on the next click so it falls back to demo mode
+                        st.session_state.pop('api_status', None)
                         st.error("❌ Invalid OpenAI API key. Please check your API key.")
                     elif "insufficient_quota" in error_msg:
+                        st.session_state.pop('api_status', None)
                         st.error("❌ OpenAI quota exceeded. Please check your account billing.")
                     else:
                         st.error(f"❌ Error generating flashcards: {error_msg}")
@@ -192,7 +251,18 @@ def generate_flashcards_tab(generator, db):
         # Review and edit mode
         edit_mode = st.checkbox("✏️ Enable Edit Mode", help="Turn on to edit questions and answers")
         
-        for i, flashcard in enumerate(st.session_state.flashcards):
+        # Only build widgets for the current page of cards
+        total_pages = math.ceil(len(st.session_state.flashcards) / CARDS_PER_PAGE)
+        page = 1
+        if total_pages > 1:
+            # A new, shorter deck may leave the remembered page out of range
+            if st.session_state.get("card_page", 1) > total_pages:
+                st.session_state.card_page = total_pages
+            page = st.number_input("Page", min_value=1, max_value=total_pages, step=1, key="card_page")
+        start = (page - 1) * CARDS_PER_PAGE
+        page_cards = st.session_state.flashcards[start:start + CARDS_PER_PAGE]
+        
+        for i, flashcard in enumerate(page_cards, start=start):
             with st.expander(f"Card {i+1}: {flashcard['question'][:50]}{'...' if len(flashcard['question']) > 50 else ''}"):
                 col1, col2 = st.columns(2)
                 
@@ -205,7 +275,7 @@ def generate_flashcards_tab(generator, db):
                             key=f"q_{i}",
                             height=100
                         )
-                        st.session_state.edited_flashcards[i]['question'] = edited_question
+                        flashcard['question'] = edited_question
                     else:
                         st.write(flashcard['question'])
                 
@@ -218,7 +288,7 @@ def generate_flashcards_tab(generator, db):
                             key=f"a_{i}",
                             height=100
                         )
-                        st.session_state.edited_flashcards[i]['answer'] = edited_answer
+                        flashcard['answer'] = edited_answer
                     else:
                         st.write(flashcard['answer'])
                 
@@ -243,7 +313,8 @@ def generate_flashcards_tab(generator, db):
                     try:
                         db = get_database_manager()
                         set_id = db.create_flashcard_set(save_title.strip(), subject, difficulty)
-                        db.add_flashcards_to_set(set_id, st.session_state.edited_flashcards)
+                        db.add_flashcards_to_set(set_id, st.session_state.flashcards)
+                        invalidate_flashcard_caches()
                         st.success(f"Saved flashcard set: {save_title}")
                         st.session_state.current_set_id = set_id
                     except Exception as e:
@@ -255,39 +326,32 @@ def generate_flashcards_tab(generator, db):
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            if st.button("📄 Export as CSV"):
-                csv_data = generate_csv_export(st.session_state.edited_flashcards)
-                st.download_button(
-                    label="⬇️ Download CSV",
-                    data=csv_data,
-                    file_name="flashcards.csv",
-                    mime="text/csv"
-                )
+            st.download_button(
+                label="⬇️ Download CSV",
+                data=generate_csv_export(st.session_state.flashcards),
+                file_name="flashcards.csv",
+                mime="text/csv"
+            )
         
         with col2:
-            if st.button("📋 Export as JSON"):
-                json_data = generate_json_export(st.session_state.edited_flashcards)
-                st.download_button(
-                    label="⬇️ Download JSON",
-                    data=json_data,
-                    file_name="flashcards.json",
-                    mime="application/json"
-                )
+            st.download_button(
+                label="⬇️ Download JSON",
+                data=generate_json_export(st.session_state.flashcards),
+                file_name="flashcards.json",
+                mime="application/json"
+            )
         
         with col3:
-            if st.button("🃏 Export for Anki"):
-                anki_data = generate_anki_export(st.session_state.edited_flashcards)
-                st.download_button(
-                    label="⬇️ Download Anki Format",
-                    data=anki_data,
-                    file_name="flashcards_anki.txt",
-                    mime="text/plain"
-                )
+            st.download_button(
+                label="⬇️ Download Anki Format",
+                data=generate_anki_export(st.session_state.flashcards),
+                file_name="flashcards_anki.txt",
+                mime="text/plain"
+            )
         
         # Clear flashcards button
         if st.button("🗑️ Clear All Flashcards"):
             st.session_state.flashcards = []
-            st.session_state.edited_flashcards = []
             st.rerun()
 
 def manage_flashcards_tab(db):
@@ -309,7 +373,7 @@ def manage_flashcards_tab(db):
         if search_query:
             flashcard_sets = db.search_flashcard_sets(search_query)
         else:
-            flashcard_sets = db.get_all_flashcard_sets()
+            flashcard_sets = get_cached_flashcard_sets(db)
         
         if not flashcard_sets:
             if search_query:
@@ -335,6 +399,7 @@ def manage_flashcards_tab(db):
                 with col3:
                     if st.button(f"🗑️ Delete", key=f"delete_{fs['id']}"):
                         if db.delete_flashcard_set(fs['id']):
+                            invalidate_flashcard_caches()
                             st.success("Deleted successfully!")
                             st.rerun()
                         else:
@@ -374,34 +439,31 @@ def view_flashcard_set(db, set_id):
         flashcards_list = flashcard_data['flashcards']
         
         with col1:
-            if st.button("📄 Export CSV", key=f"csv_{set_id}"):
-                csv_data = generate_csv_export(flashcards_list)
-                st.download_button(
-                    label="⬇️ Download CSV",
-                    data=csv_data,
-                    file_name=f"{flashcard_data['title']}_flashcards.csv",
-                    mime="text/csv"
-                )
+            st.download_button(
+                label="⬇️ Download CSV",
+                data=generate_csv_export(flashcards_list),
+                file_name=f"{flashcard_data['title']}_flashcards.csv",
+                mime="text/csv",
+                key=f"download_csv_{set_id}"
+            )
         
         with col2:
-            if st.button("📋 Export JSON", key=f"json_{set_id}"):
-                json_data = generate_json_export(flashcards_list)
-                st.download_button(
-                    label="⬇️ Download JSON",
-                    data=json_data,
-                    file_name=f"{flashcard_data['title']}_flashcards.json",
-                    mime="application/json"
-                )
+            st.download_button(
+                label="⬇️ Download JSON",
+                data=generate_json_export(flashcards_list),
+                file_name=f"{flashcard_data['title']}_flashcards.json",
+                mime="application/json",
+                key=f"download_json_{set_id}"
+            )
         
         with col3:
-            if st.button("🃏 Export Anki", key=f"anki_{set_id}"):
-                anki_data = generate_anki_export(flashcards_list)
-                st.download_button(
-                    label="⬇️ Download Anki",
-                    data=anki_data,
-                    file_name=f"{flashcard_data['title']}_anki.txt",
-                    mime="text/plain"
-                )
+            st.download_button(
+                label="⬇️ Download Anki",
+                data=generate_anki_export(flashcards_list),
+                file_name=f"{flashcard_data['title']}_anki.txt",
+                mime="text/plain",
+                key=f"download_anki_{set_id}"
+            )
     
     except Exception as e:
         st.error(f"Error viewing flashcard set: {str(e)}")
@@ -411,7 +473,7 @@ def statistics_tab(db):
     st.header("📊 Statistics")
     
     try:
-        stats = db.get_statistics()
+        stats = get_cached_statistics(db)
         
         # Display key metrics
         col1, col2, col3 = st.columns(3)
@@ -440,28 +502,53 @@ def statistics_tab(db):
         st.error(f"Error loading statistics: {str(e)}")
         st.info("Database may not be properly initialized")
 
+# Every edit produces a new deck to cache, so bound the process-wide export caches
+EXPORT_CACHE_MAX_ENTRIES = 32
+
+@st.cache_data(show_spinner=False, max_entries=EXPORT_CACHE_MAX_ENTRIES)
 def generate_csv_export(flashcards):
     """Generate CSV format for flashcards export"""
-    df = pd.DataFrame(flashcards)
-    return df.to_csv(index=False)
+    output = io.StringIO()
+    writer = csv.DictWriter(
+        output,
+        fieldnames=['question', 'answer', 'difficulty', 'topic'],
+        restval='',
+        extrasaction='ignore',
+        lineterminator='\n'
+    )
+    writer.writeheader()
+    writer.writerows(flashcards)
+    return output.getvalue()
 
 def generate_json_export(flashcards):
-    """Generate JSON format for flashcards export"""
+    """Generate JSON format for flashcards export; not cached so exported_at stays current"""
     export_data = {
         "flashcards": flashcards,
         "total_count": len(flashcards),
-        "exported_at": pd.Timestamp.now().isoformat()
+        "exported_at": datetime.now().isoformat()
     }
-    return json.dumps(export_data, indent=2)
+    if orjson is not None:
+        return orjson.dumps(export_data)
+    return json.dumps(export_data, separators=(',', ':'))
+
+def _sanitize_anki_field(text):
+    """Keep tabs and newlines from breaking Anki's one-note-per-line import"""
+    return text.replace('\t', ' ').replace('\r\n', '<br>').replace('\n', '<br>')
 
+@st.cache_data(show_spinner=False, max_entries=EXPORT_CACHE_MAX_ENTRIES)
 def generate_anki_export(flashcards):
     """Generate Anki-compatible format for flashcards export"""
-    anki_content = []
-    for card in flashcards:
-        # Anki format: Question<tab>Answer
-        line = f"{card['question']}\t{card['answer']}"
-        anki_content.append(line)
-    return "\n".join(anki_content)
+    # Sanitize the whole deck in one pass
+    sanitized = transform_fields_bulk(
+        [field for card in flashcards for field in (card['question'], card['answer'])],
+        _sanitize_anki_field
+    )
+    
+    # Anki format: Question<tab>Answer
+    return "\n".join(
+        f"{question}\t{answer}"
+        for question, answer in zip(sanitized[::2], sanitized[1::2])
+    )
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,8 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import create_engine, func, text, Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, joinedload
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
@@ -14,17 +15,24 @@ class FlashcardSet(Base):
     title = Column(String(255), nullable=False)
     subject = Column(String(100), nullable=False)
     difficulty = Column(String(50), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship to flashcards
     flashcards = relationship("Flashcard", back_populates="flashcard_set", cascade="all, delete-orphan")
 
+# Search uses ILIKE '%query%', which only trigram indexes can serve (PostgreSQL only)
+TRIGRAM_INDEX_STATEMENTS = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_flashcard_sets_title_trgm ON flashcard_sets USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_flashcard_sets_subject_trgm ON flashcard_sets USING gin (subject gin_trgm_ops)"
+)
+
 class Flashcard(Base):
     __tablename__ = 'flashcards'
     
     id = Column(Integer, primary_key=True, index=True)
-    set_id = Column(Integer, ForeignKey('flashcard_sets.id'), nullable=False)
+    set_id = Column(Integer, ForeignKey('flashcard_sets.id'), nullable=False, index=True)
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
     difficulty = Column(String(50))
@@ -41,137 +49,171 @@ class DatabaseManager:
         if not self.database_url:
             raise ValueError("DATABASE_URL environment variable not found")
         
-        self.engine = create_engine(self.database_url)
+        engine_options = {"pool_pre_ping": True}
+        if not self.database_url.startswith("sqlite"):
+            engine_options.update(pool_size=10, max_overflow=20)
+        self.engine = create_engine(self.database_url, **engine_options)
         Base.metadata.create_all(bind=self.engine)
         
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        self.session = SessionLocal()
+        # Idempotent, so databases created before these indexes existed get them too
+        if self.engine.dialect.name == "postgresql":
+            try:
+                with self.engine.begin() as connection:
+                    for statement in TRIGRAM_INDEX_STATEMENTS:
+                        connection.execute(text(statement))
+            except DBAPIError as e:
+                # Roles without CREATE, or hosts that block pg_trgm, just search unindexed
+                print(f"Skipping trigram search indexes: {str(e)}")
+        
+        # One short-lived session per operation; the manager itself is shared across reruns
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine)
     
     def create_flashcard_set(self, title: str, subject: str, difficulty: str) -> int:
         """Create a new flashcard set and return its ID"""
-        flashcard_set = FlashcardSet(
-            title=title,
-            subject=subject,
-            difficulty=difficulty
-        )
-        self.session.add(flashcard_set)
-        self.session.commit()
-        self.session.refresh(flashcard_set)
-        return int(flashcard_set.id)
+        with self.SessionLocal() as session:
+            flashcard_set = FlashcardSet(
+                title=title,
+                subject=subject,
+                difficulty=difficulty
+            )
+            session.add(flashcard_set)
+            # The flush's INSERT reports the new ID (RETURNING or lastrowid, per dialect),
+            # and expire_on_commit=False keeps it readable without a refresh SELECT
+            session.flush()
+            session.commit()
+            return flashcard_set.id
     
     def add_flashcards_to_set(self, set_id: int, flashcards: List[Dict[str, Any]]) -> None:
         """Add multiple flashcards to a set"""
-        for card_data in flashcards:
-            flashcard = Flashcard(
-                set_id=set_id,
-                question=card_data.get('question', ''),
-                answer=card_data.get('answer', ''),
-                difficulty=card_data.get('difficulty', 'Medium'),
-                topic=card_data.get('topic', '')
-            )
-            self.session.add(flashcard)
-        self.session.commit()
+        with self.SessionLocal() as session:
+            session.bulk_insert_mappings(Flashcard, [
+                {
+                    'set_id': set_id,
+                    'question': card_data.get('question', ''),
+                    'answer': card_data.get('answer', ''),
+                    'difficulty': card_data.get('difficulty', 'Medium'),
+                    'topic': card_data.get('topic', '')
+                }
+                for card_data in flashcards
+            ])
+            session.commit()
     
     def get_all_flashcard_sets(self) -> List[Dict[str, Any]]:
         """Get all flashcard sets with basic info"""
-        sets = self.session.query(FlashcardSet).order_by(FlashcardSet.created_at.desc()).all()
-        return [
-            {
-                'id': fs.id,
-                'title': fs.title,
-                'subject': fs.subject,
-                'difficulty': fs.difficulty,
-                'created_at': fs.created_at,
-                'card_count': len(fs.flashcards)
-            }
-            for fs in sets
-        ]
+        with self.SessionLocal() as session:
+            rows = self._set_summary_query(session).order_by(FlashcardSet.created_at.desc()).all()
+            return [self._set_summary_to_dict(row) for row in rows]
     
     def get_flashcard_set_with_cards(self, set_id: int) -> Optional[Dict[str, Any]]:
         """Get a flashcard set with all its cards"""
-        flashcard_set = self.session.query(FlashcardSet).filter(FlashcardSet.id == set_id).first()
-        if not flashcard_set:
-            return None
-        
-        return {
-            'id': flashcard_set.id,
-            'title': flashcard_set.title,
-            'subject': flashcard_set.subject,
-            'difficulty': flashcard_set.difficulty,
-            'created_at': flashcard_set.created_at,
-            'flashcards': [
-                {
-                    'id': card.id,
-                    'question': card.question,
-                    'answer': card.answer,
-                    'difficulty': card.difficulty,
-                    'topic': card.topic
-                }
-                for card in flashcard_set.flashcards
-            ]
-        }
+        with self.SessionLocal() as session:
+            flashcard_set = session.query(FlashcardSet).options(
+                joinedload(FlashcardSet.flashcards)
+            ).filter(FlashcardSet.id == set_id).first()
+            if not flashcard_set:
+                return None
+            
+            return {
+                'id': flashcard_set.id,
+                'title': flashcard_set.title,
+                'subject': flashcard_set.subject,
+                'difficulty': flashcard_set.difficulty,
+                'created_at': flashcard_set.created_at,
+                'flashcards': [
+                    {
+                        'id': card.id,
+                        'question': card.question,
+                        'answer': card.answer,
+                        'difficulty': card.difficulty,
+                        'topic': card.topic
+                    }
+                    for card in flashcard_set.flashcards
+                ]
+            }
     
     def update_flashcard(self, flashcard_id: int, question: str, answer: str) -> bool:
         """Update a flashcard's question and answer"""
-        flashcard = self.session.query(Flashcard).filter(Flashcard.id == flashcard_id).first()
-        if flashcard:
-            flashcard.question = question
-            flashcard.answer = answer
-            self.session.commit()
-            return True
-        return False
+        with self.SessionLocal() as session:
+            flashcard = session.query(Flashcard).filter(Flashcard.id == flashcard_id).first()
+            if flashcard:
+                flashcard.question = question
+                flashcard.answer = answer
+                session.commit()
+                return True
+            return False
     
     def delete_flashcard_set(self, set_id: int) -> bool:
         """Delete a flashcard set and all its cards"""
-        flashcard_set = self.session.query(FlashcardSet).filter(FlashcardSet.id == set_id).first()
-        if flashcard_set:
-            self.session.delete(flashcard_set)
-            self.session.commit()
-            return True
-        return False
+        with self.SessionLocal() as session:
+            flashcard_set = session.query(FlashcardSet).filter(FlashcardSet.id == set_id).first()
+            if flashcard_set:
+                session.delete(flashcard_set)
+                session.commit()
+                return True
+            return False
     
     def delete_flashcard(self, flashcard_id: int) -> bool:
         """Delete a single flashcard"""
-        flashcard = self.session.query(Flashcard).filter(Flashcard.id == flashcard_id).first()
-        if flashcard:
-            self.session.delete(flashcard)
-            self.session.commit()
-            return True
-        return False
+        with self.SessionLocal() as session:
+            flashcard = session.query(Flashcard).filter(Flashcard.id == flashcard_id).first()
+            if flashcard:
+                session.delete(flashcard)
+                session.commit()
+                return True
+            return False
     
     def search_flashcard_sets(self, query: str) -> List[Dict[str, Any]]:
         """Search flashcard sets by title or subject"""
-        sets = self.session.query(FlashcardSet).filter(
-            (FlashcardSet.title.ilike(f'%{query}%')) |
-            (FlashcardSet.subject.ilike(f'%{query}%'))
-        ).order_by(FlashcardSet.created_at.desc()).all()
-        
-        return [
-            {
-                'id': fs.id,
-                'title': fs.title,
-                'subject': fs.subject,
-                'difficulty': fs.difficulty,
-                'created_at': fs.created_at,
-                'card_count': len(fs.flashcards)
-            }
-            for fs in sets
-        ]
+        with self.SessionLocal() as session:
+            rows = self._set_summary_query(session).filter(
+                (FlashcardSet.title.ilike(f'%{query}%')) |
+                (FlashcardSet.subject.ilike(f'%{query}%'))
+            ).order_by(FlashcardSet.created_at.desc()).all()
+            return [self._set_summary_to_dict(row) for row in rows]
+    
+    def _set_summary_query(self, session):
+        """Build a column-only query of set summaries with their card counts"""
+        return session.query(
+            FlashcardSet.id,
+            FlashcardSet.title,
+            FlashcardSet.subject,
+            FlashcardSet.difficulty,
+            FlashcardSet.created_at,
+            func.count(Flashcard.id).label('card_count')
+        ).outerjoin(
+            Flashcard, Flashcard.set_id == FlashcardSet.id
+        ).group_by(FlashcardSet.id)
+    
+    def _set_summary_to_dict(self, row) -> Dict[str, Any]:
+        """Convert a set summary row into the listing dictionary"""
+        return {
+            'id': row.id,
+            'title': row.title,
+            'subject': row.subject,
+            'difficulty': row.difficulty,
+            'created_at': row.created_at,
+            'card_count': row.card_count
+        }
     
     def get_statistics(self) -> Dict[str, Any]:
         """Get database statistics"""
-        total_sets = self.session.query(FlashcardSet).count()
-        total_cards = self.session.query(Flashcard).count()
-        
-        subjects = self.session.query(FlashcardSet.subject).distinct().all()
-        subject_list = [s[0] for s in subjects]
+        with self.SessionLocal() as session:
+            # One round trip: each distinct subject row carries both totals as scalar subqueries
+            total_sets_query = session.query(func.count(FlashcardSet.id)).correlate(None).scalar_subquery()
+            total_cards_query = session.query(func.count(Flashcard.id)).correlate(None).scalar_subquery()
+            rows = session.query(
+                FlashcardSet.subject,
+                total_sets_query.label('total_sets'),
+                total_cards_query.label('total_cards')
+            ).distinct().all()
         
+        # Cards always belong to a set, so no rows means both totals are zero
         return {
-            'total_sets': total_sets,
-            'total_cards': total_cards,
-            'subjects': subject_list
+            'total_sets': rows[0].total_sets if rows else 0,
+            'total_cards': rows[0].total_cards if rows else 0,
+            'subjects': [row.subject for row in rows]
         }
     
     def close(self):
-        """Close database session"""
-        self.session.close()
+        """Release pooled database connections"""
+        self.engine.dispose()
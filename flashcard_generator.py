@@ -1,7 +1,244 @@
 import os
 import json
-from typing import List, Dict, Any
-from openai import OpenAI
+import hashlib
+import math
+import threading
+import httpx
+from contextlib import contextmanager
+from functools import lru_cache
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional
+from openai import OpenAI, BadRequestError, RateLimitError, APIConnectionError, InternalServerError
+import fastjsonschema
+from pydantic import BaseModel
+from diskcache import Cache
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+from rate_limiter import RateLimiter
+from semantic_cache import SemanticCache
+from utils import count_tokens, count_tokens_batch, split_text_by_tokens, truncate_to_tokens
+
+# orjson parses response payloads several times faster; stdlib json is the fallback
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+class GeneratedFlashcard(BaseModel):
+    """A single card as the model must return it"""
+    question: str
+    answer: str
+    difficulty: str
+    topic: str
+
+class FlashcardDeck(BaseModel):
+    """Structured-output schema for a generation response"""
+    flashcards: List[GeneratedFlashcard]
+
+def _iter_streamed_flashcards(fragments: Iterable[str]) -> Iterator[Any]:
+    """
+    Parse each object in a streamed {"flashcards": [...]} response as soon as it closes
+    
+    Args:
+        fragments: Response text in the order it arrives
+    
+    Returns:
+        Iterator of parsed card objects; malformed ones are skipped
+    """
+    buffer = ""
+    depth = 0
+    start = 0
+    in_string = False
+    escaped = False
+    
+    for fragment in fragments:
+        offset = len(buffer)
+        buffer += fragment
+        for i in range(offset, len(buffer)):
+            char = buffer[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "{[":
+                depth += 1
+                # Depth 1 is the response object, 2 the flashcards array, 3 a card
+                if depth == 3:
+                    start = i
+            elif char in "}]":
+                if depth == 3:
+                    try:
+                        yield _json_loads(buffer[start:i + 1])
+                    except ValueError:
+                        pass
+                depth -= 1
+
+def _is_transient_api_error(error: BaseException) -> bool:
+    """Rate limits, connection failures and 5xx errors may succeed on retry; an exhausted quota (also a 429) won't"""
+    if isinstance(error, RateLimitError):
+        return error.code != "insufficient_quota"
+    return isinstance(error, (APIConnectionError, InternalServerError))
+
+# Transient API failures are retried with jittered exponential backoff
+_api_retry = retry(
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(3),
+    retry=retry_if_exception(_is_transient_api_error),
+    reraise=True
+)
+
+# Streamlit sessions share one cached generator, so cap in-flight API calls across threads
+MAX_CONCURRENT_REQUESTS = 10
+_request_slots = threading.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+# Chat requests are paced to the account's limits so concurrency doesn't end in 429 retries
+_rate_limiter = RateLimiter(
+    requests_per_minute=int(os.getenv("OPENAI_RPM_LIMIT", "500")),
+    tokens_per_minute=int(os.getenv("OPENAI_TPM_LIMIT", "30000"))
+)
+
+# Connection pool shared by every generator in the process
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 50
+
+# A dead endpoint fails its connect quickly; _api_retry is the only retry layer
+CONNECT_TIMEOUT_SECONDS = 10
+REQUEST_TIMEOUT_SECONDS = 60
+
+@lru_cache(maxsize=1)
+def _get_client(api_key: str) -> OpenAI:
+    """Create the OpenAI client once per process so reruns reuse its warm connections"""
+    # Retries are handled by _api_retry, so disable the client's own
+    return OpenAI(
+        api_key=api_key,
+        max_retries=0,
+        timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+        http_client=httpx.Client(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+        )
+    )
+
+# Content above this many tokens is split across parallel requests
+MAX_CHUNK_TOKENS = 3000
+
+# Longer content is truncated before generation to bound cost and latency
+MAX_CONTENT_TOKENS = 12000
+
+# Responses are reused for identical prompts for a week
+CACHE_DIR = ".fc_cache"
+CACHE_EXPIRE_SECONDS = 7 * 24 * 3600
+
+# Near-duplicate content reuses an earlier deck above this cosine similarity
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_MAX_TOKENS = 6000
+SEMANTIC_CACHE_THRESHOLD = 0.93
+EMBEDDING_TIMEOUT = httpx.Timeout(5, connect=2)
+
+# Prompt and demo data are built once at import and shared read-only
+_DIFFICULTY_INSTRUCTIONS = MappingProxyType({
+    "Easy": "Focus on basic concepts, definitions, and simple recall questions.",
+    "Medium": "Include application-based questions and moderate complexity concepts.",
+    "Hard": "Create analytical, synthesis, and evaluation-level questions requiring deep understanding.",
+    "Mixed": "Include a variety of difficulty levels from basic recall to analytical thinking."
+})
+
+_SUBJECT_GUIDANCE = MappingProxyType({
+    "Biology": "Focus on biological processes, organisms, anatomy, and scientific principles.",
+    "Chemistry": "Emphasize chemical reactions, formulas, periodic table, and laboratory concepts.",
+    "Physics": "Concentrate on laws, formulas, phenomena, and problem-solving concepts.",
+    "History": "Include dates, events, causes and effects, and historical significance.",
+    "Literature": "Focus on themes, characters, literary devices, and analysis.",
+    "Mathematics": "Include formulas, theorems, problem-solving steps, and mathematical concepts.",
+    "Computer Science": "Emphasize algorithms, data structures, programming concepts, and technical definitions.",
+    "Psychology": "Focus on theories, terminology, research methods, and psychological phenomena.",
+    "Economics": "Include economic principles, theories, market concepts, and terminology.",
+    "General": "Create well-rounded questions covering key concepts and important information."
+})
+
+# Questions and answers need at least 10 non-blank characters once stripped
+_MIN_CONTENT_PATTERN = r"^\s*\S[\s\S]{8,}\S\s*$"
+
+# Compiled once at import into specialized validation code
+_validate_flashcard_schema = fastjsonschema.compile({
+    "type": "object",
+    "required": ["question", "answer"],
+    "properties": {
+        "question": {"type": "string", "maxLength": 500, "pattern": _MIN_CONTENT_PATTERN},
+        "answer": {"type": "string", "maxLength": 1000, "pattern": _MIN_CONTENT_PATTERN}
+    }
+})
+
+# Literal braces in the JSON example are doubled for str.format_map
+_PROMPT_TEMPLATE = """
+You are tasked with creating {num_flashcards} high-quality educational flashcards from the provided content.
+
+SUBJECT: {subject}
+DIFFICULTY LEVEL: {difficulty}
+INSTRUCTIONS: {difficulty_instructions}
+SUBJECT GUIDANCE: {subject_guidance}
+
+CONTENT TO PROCESS:
+{content}
+
+REQUIREMENTS:
+1. Generate exactly {num_flashcards} flashcards
+2. Each flashcard must have a clear, specific question and a comprehensive answer
+3. Questions should test understanding, not just memorization
+4. Answers should be complete and self-contained (no references to "the text above")
+5. Focus on the most important concepts and information
+6. Ensure factual accuracy and educational value
+7. Vary question types (definition, application, analysis, comparison, etc.)
+8. If the content allows, distribute questions across different topics/sections
+
+RESPONSE FORMAT:
+Respond with a JSON object containing a "flashcards" array. Each flashcard should have:
+- "question": A clear, specific question
+- "answer": A comprehensive, accurate answer
+- "difficulty": The difficulty level of this specific question
+- "topic": The specific topic or concept this flashcard covers
+
+Example format:
+{{
+  "flashcards": [
+    {{
+      "question": "What is photosynthesis and why is it important for life on Earth?",
+      "answer": "Photosynthesis is the process by which plants convert light energy into chemical energy, producing glucose and oxygen from carbon dioxide and water. It's crucial because it provides oxygen for most life forms and forms the base of most food chains.",
+      "difficulty": "Medium",
+      "topic": "Plant Biology"
+    }}
+  ]
+}}
+
+Generate the flashcards now:
+"""
+
+_DEMO_TEMPLATES = MappingProxyType({
+    "Biology": (
+        {"question": "What is photosynthesis?", "answer": "The process by which plants convert light energy into chemical energy using chlorophyll.", "difficulty": "Easy", "topic": "Plant Biology"},
+        {"question": "What is the function of mitochondria?", "answer": "Mitochondria are the powerhouse of the cell, producing ATP through cellular respiration.", "difficulty": "Medium", "topic": "Cell Biology"},
+        {"question": "What is DNA?", "answer": "Deoxyribonucleic acid, the hereditary material that contains genetic instructions for all living organisms.", "difficulty": "Medium", "topic": "Genetics"},
+    ),
+    "Chemistry": (
+        {"question": "What is the periodic table?", "answer": "A tabular arrangement of chemical elements organized by atomic number and electron configuration.", "difficulty": "Easy", "topic": "Elements"},
+        {"question": "What is a covalent bond?", "answer": "A chemical bond formed by the sharing of electrons between atoms.", "difficulty": "Medium", "topic": "Chemical Bonding"},
+        {"question": "What is pH?", "answer": "A scale used to measure the acidity or alkalinity of a solution, ranging from 0 to 14.", "difficulty": "Medium", "topic": "Acids and Bases"},
+    ),
+    "Physics": (
+        {"question": "What is Newton's first law?", "answer": "An object at rest stays at rest and an object in motion stays in motion unless acted upon by an external force.", "difficulty": "Medium", "topic": "Classical Mechanics"},
+        {"question": "What is the speed of light?", "answer": "Approximately 299,792,458 meters per second in a vacuum.", "difficulty": "Easy", "topic": "Optics"},
+        {"question": "What is energy?", "answer": "The capacity to do work or cause change, existing in various forms like kinetic, potential, and thermal.", "difficulty": "Easy", "topic": "Energy"},
+    ),
+    "General": (
+        {"question": "What is the main topic of this content?", "answer": "Based on the provided educational material, this covers fundamental concepts in the subject area.", "difficulty": "Easy", "topic": "Overview"},
+        {"question": "What are the key concepts mentioned?", "answer": "The content discusses important principles and definitions relevant to understanding the subject matter.", "difficulty": "Medium", "topic": "Key Concepts"},
+        {"question": "How can this knowledge be applied?", "answer": "These concepts form the foundation for more advanced study and practical application in the field.", "difficulty": "Medium", "topic": "Application"},
+    )
+})
 
 class FlashcardGenerator:
     def __init__(self):
@@ -10,15 +247,49 @@ class FlashcardGenerator:
         if not self.openai_api_key:
             raise ValueError("OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
         
-        self.client = OpenAI(api_key=self.openai_api_key)
+        self.client = _get_client(self.openai_api_key)
         # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
         # do not change this unless explicitly requested by the user
         self.model = "gpt-4o"
+        self.cache = Cache(CACHE_DIR)
+        self.semantic_cache = SemanticCache(self.cache, threshold=SEMANTIC_CACHE_THRESHOLD)
+    
+    @_api_retry
+    def _create_completion(self, **kwargs):
+        """Create a chat completion, retrying transient failures with exponential backoff"""
+        _rate_limiter.acquire(self._estimate_request_tokens(kwargs))
+        with _request_slots:
+            return self.client.chat.completions.create(**kwargs)
+    
+    @_api_retry
+    def _parse_completion(self, **kwargs):
+        """Create a structured-output chat completion, retrying transient failures with exponential backoff"""
+        _rate_limiter.acquire(self._estimate_request_tokens(kwargs))
+        with _request_slots:
+            return self.client.beta.chat.completions.parse(**kwargs)
+    
+    def _estimate_request_tokens(self, request: Dict[str, Any]) -> int:
+        """Upper-bound the tokens a chat request can use: its prompt plus the completion limit"""
+        prompt_tokens = sum(count_tokens(message["content"]) for message in request["messages"])
+        return prompt_tokens + request.get("max_tokens", 0)
+    
+    def _create_embedding(self, text: str) -> List[float]:
+        """Embed text in a single short attempt; it only feeds a cache lookup, so failing fast beats retrying"""
+        with _request_slots:
+            response = self.client.with_options(timeout=EMBEDDING_TIMEOUT).embeddings.create(
+                model=EMBEDDING_MODEL, input=text
+            )
+        return response.data[0].embedding
+    
+    def _map_concurrently(self, func: Callable, items: Iterable) -> List[Any]:
+        """Run func over items on worker threads, preserving order; _request_slots bounds the API load"""
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            return list(executor.map(func, items))
     
     def test_api_connection(self) -> tuple[bool, str]:
         """Test if the OpenAI API key is working"""
         try:
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model=self.model,
                 messages=[{"role": "user", "content": "Hello"}],
                 max_tokens=5
@@ -36,51 +307,29 @@ class FlashcardGenerator:
     def generate_demo_flashcards(self, content: str, subject: str = "General", 
                                 num_flashcards: int = 15, difficulty: str = "Mixed") -> List[Dict[str, Any]]:
         """Generate demo flashcards for testing when API is not available"""
-        demo_templates = {
-            "Biology": [
-                {"question": "What is photosynthesis?", "answer": "The process by which plants convert light energy into chemical energy using chlorophyll.", "difficulty": "Easy", "topic": "Plant Biology"},
-                {"question": "What is the function of mitochondria?", "answer": "Mitochondria are the powerhouse of the cell, producing ATP through cellular respiration.", "difficulty": "Medium", "topic": "Cell Biology"},
-                {"question": "What is DNA?", "answer": "Deoxyribonucleic acid, the hereditary material that contains genetic instructions for all living organisms.", "difficulty": "Medium", "topic": "Genetics"},
-            ],
-            "Chemistry": [
-                {"question": "What is the periodic table?", "answer": "A tabular arrangement of chemical elements organized by atomic number and electron configuration.", "difficulty": "Easy", "topic": "Elements"},
-                {"question": "What is a covalent bond?", "answer": "A chemical bond formed by the sharing of electrons between atoms.", "difficulty": "Medium", "topic": "Chemical Bonding"},
-                {"question": "What is pH?", "answer": "A scale used to measure the acidity or alkalinity of a solution, ranging from 0 to 14.", "difficulty": "Medium", "topic": "Acids and Bases"},
-            ],
-            "Physics": [
-                {"question": "What is Newton's first law?", "answer": "An object at rest stays at rest and an object in motion stays in motion unless acted upon by an external force.", "difficulty": "Medium", "topic": "Classical Mechanics"},
-                {"question": "What is the speed of light?", "answer": "Approximately 299,792,458 meters per second in a vacuum.", "difficulty": "Easy", "topic": "Optics"},
-                {"question": "What is energy?", "answer": "The capacity to do work or cause change, existing in various forms like kinetic, potential, and thermal.", "difficulty": "Easy", "topic": "Energy"},
-            ],
-            "General": [
-                {"question": "What is the main topic of this content?", "answer": "Based on the provided educational material, this covers fundamental concepts in the subject area.", "difficulty": "Easy", "topic": "Overview"},
-                {"question": "What are the key concepts mentioned?", "answer": "The content discusses important principles and definitions relevant to understanding the subject matter.", "difficulty": "Medium", "topic": "Key Concepts"},
-                {"question": "How can this knowledge be applied?", "answer": "These concepts form the foundation for more advanced study and practical application in the field.", "difficulty": "Medium", "topic": "Application"},
-            ]
-        }
-        
         # Get appropriate templates or use general ones
-        templates = demo_templates.get(subject, demo_templates["General"])
+        templates = _DEMO_TEMPLATES.get(subject, _DEMO_TEMPLATES["General"])
         
-        # Generate flashcards based on requested number
+        # Generate flashcards based on requested number, cycling through the templates up to 3 times
+        count = min(num_flashcards, len(templates) * 3)
         flashcards = []
-        for i in range(min(num_flashcards, len(templates) * 3)):  # Allow up to 3x templates
-            template_index = i % len(templates)
-            template = templates[template_index].copy()
-            
+        for cycle in range(3):
             # Add some variation for repeated templates
-            if i >= len(templates):
-                variation = i // len(templates)
-                template["question"] = f"[Variation {variation + 1}] {template['question']}"
-                template["answer"] = f"{template['answer']} (Additional context based on provided content)"
-            
-            # Set difficulty based on request
-            if difficulty != "Mixed":
-                template["difficulty"] = difficulty
+            prefix = f"[Variation {cycle + 1}] " if cycle else ""
+            suffix = " (Additional context based on provided content)" if cycle else ""
             
-            flashcards.append(template)
+            for base in templates:
+                if len(flashcards) == count:
+                    break
+                flashcards.append({
+                    "question": prefix + base["question"],
+                    "answer": base["answer"] + suffix,
+                    # Set difficulty based on request
+                    "difficulty": base["difficulty"] if difficulty == "Mixed" else difficulty,
+                    "topic": base["topic"]
+                })
         
-        return flashcards[:num_flashcards]
+        return flashcards
     
     def generate_flashcards(self, content: str, subject: str = "General", 
                           num_flashcards: int = 15, difficulty: str = "Mixed") -> List[Dict[str, Any]]:
@@ -97,130 +346,314 @@ class FlashcardGenerator:
             List of flashcard dictionaries with question, answer, and metadata
         """
         try:
-            prompt = self._create_prompt(content, subject, num_flashcards, difficulty)
+            content, chunks = self._split_content(content, num_flashcards)
+            jobs = [(content, num_flashcards)] if len(chunks) <= 1 else self._chunk_jobs(chunks, num_flashcards)
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert educational content creator specializing in generating high-quality flashcards for learning and retention."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.7,
-                max_tokens=3000
-            )
+            # An exact prompt match is a local lookup, so try it before paying for an embedding
+            cached = self._cached_flashcards(jobs, subject, difficulty)
+            if cached is not None:
+                return cached
             
-            response_content = response.choices[0].message.content
-            if response_content is None:
-                raise ValueError("Empty response from OpenAI")
-            result = json.loads(response_content)
+            # Near-duplicate content generated with the same settings reuses that deck
+            scope = self._semantic_scope(subject, num_flashcards, difficulty)
+            embedding = self._embed_for_cache(content)
+            if embedding is not None:
+                cached = self.semantic_cache.lookup(embedding, scope)
+                if cached is not None:
+                    return cached
             
-            # Validate and process the response
-            if "flashcards" in result and isinstance(result["flashcards"], list):
-                flashcards = []
-                for card in result["flashcards"]:
-                    if self._validate_flashcard(card):
-                        flashcards.append({
-                            "question": card.get("question", "").strip(),
-                            "answer": card.get("answer", "").strip(),
-                            "difficulty": card.get("difficulty", difficulty),
-                            "topic": card.get("topic", subject)
-                        })
-                
-                return flashcards[:num_flashcards]  # Ensure we don't exceed requested number
-            else:
-                raise ValueError("Invalid response format from OpenAI")
+            flashcards = self._generate_from_jobs(jobs, subject, num_flashcards, difficulty)
+            
+            # A short deck isn't cached, so generating again gets a fresh attempt
+            if embedding is not None and len(flashcards) == num_flashcards:
+                self.semantic_cache.add(embedding, scope, flashcards)
+            return flashcards
                 
         except Exception as e:
             print(f"Error generating flashcards: {str(e)}")
             raise e
     
-    def _create_prompt(self, content: str, subject: str, num_flashcards: int, difficulty: str) -> str:
-        """Create an optimized prompt for flashcard generation"""
+    def stream_flashcards(self, content: str, subject: str = "General",
+                          num_flashcards: int = 15, difficulty: str = "Mixed") -> Iterator[Dict[str, Any]]:
+        """
+        Generate flashcards, yielding each card as soon as the model finishes writing it
         
-        difficulty_instructions = {
-            "Easy": "Focus on basic concepts, definitions, and simple recall questions.",
-            "Medium": "Include application-based questions and moderate complexity concepts.",
-            "Hard": "Create analytical, synthesis, and evaluation-level questions requiring deep understanding.",
-            "Mixed": "Include a variety of difficulty levels from basic recall to analytical thinking."
-        }
+        Args:
+            content: Educational text content
+            subject: Subject type for optimized prompting
+            num_flashcards: Number of flashcards to generate
+            difficulty: Difficulty level (Easy, Medium, Hard, Mixed)
+        
+        Returns:
+            Iterator of flashcard dictionaries with question, answer, and metadata
+        """
+        try:
+            content, chunks = self._split_content(content, num_flashcards)
+            if len(chunks) > 1:
+                # Parallel chunk requests finish sooner than one long stream
+                yield from self.generate_flashcards(content, subject, num_flashcards, difficulty)
+                return
+            
+            cached = self._cached_flashcards([(content, num_flashcards)], subject, difficulty)
+            if cached is not None:
+                yield from cached
+                return
+            
+            scope = self._semantic_scope(subject, num_flashcards, difficulty)
+            embedding = self._embed_for_cache(content)
+            if embedding is not None:
+                cached = self.semantic_cache.lookup(embedding, scope)
+                if cached is not None:
+                    yield from cached
+                    return
+            
+            prompt = self._create_prompt(content, subject, num_flashcards, difficulty)
+            flashcards = []
+            with self._stream_completion(**self._generation_request(prompt, FlashcardDeck)) as stream:
+                for card in _iter_streamed_flashcards(self._stream_fragments(stream)):
+                    if self._validate_flashcard(card):
+                        flashcard = self._normalize_flashcard(card, subject, difficulty)
+                        flashcards.append(flashcard)
+                        yield flashcard
+                        if len(flashcards) == num_flashcards:
+                            break
+            
+            # A short deck isn't cached, so generating again gets a fresh attempt
+            if len(flashcards) == num_flashcards:
+                self.cache.set(self._cache_key(prompt), flashcards, expire=CACHE_EXPIRE_SECONDS)
+                if embedding is not None:
+                    self.semantic_cache.add(embedding, scope, flashcards)
+                
+        except Exception as e:
+            print(f"Error streaming flashcards: {str(e)}")
+            raise e
+    
+    @contextmanager
+    def _stream_completion(self, **kwargs):
+        """
+        Open a structured-output completion stream, holding a request slot until it is closed.
+        Not retried: cards may already have been handed to the caller when a stream fails.
+        """
+        _rate_limiter.acquire(self._estimate_request_tokens(kwargs))
+        with _request_slots:
+            with self.client.beta.chat.completions.stream(**kwargs) as stream:
+                yield stream
+    
+    def _stream_fragments(self, stream) -> Iterator[str]:
+        """Yield the response text of a completion stream as it arrives"""
+        for event in stream:
+            if event.type == "content.delta":
+                yield event.delta
+            elif event.type == "refusal.done":
+                raise ValueError(event.refusal)
+    
+    def _semantic_scope(self, subject: str, num_flashcards: int, difficulty: str) -> str:
+        """Generation settings a semantically cached deck must match"""
+        return f"{self.model}|{subject}|{num_flashcards}|{difficulty}"
+    
+    def _split_content(self, content: str, num_flashcards: int) -> tuple[str, List[str]]:
+        """Cap content at MAX_CONTENT_TOKENS and split it into the chunks to generate from"""
+        content_tokens = count_tokens(content)
+        if content_tokens > MAX_CONTENT_TOKENS:
+            content = truncate_to_tokens(content, MAX_CONTENT_TOKENS)
+            content_tokens = MAX_CONTENT_TOKENS
+        
+        # Grow the budget with the content so there are roughly no more chunks than cards;
+        # sentence packing can still overshoot, which _chunk_jobs absorbs by merging
+        chunk_tokens = max(MAX_CHUNK_TOKENS, math.ceil(content_tokens / num_flashcards))
+        return content, split_text_by_tokens(content, chunk_tokens)
+    
+    def _embed_for_cache(self, content: str) -> Optional[List[float]]:
+        """Embed content for the semantic cache; failures only disable the lookup"""
+        try:
+            return self._create_embedding(truncate_to_tokens(content, EMBEDDING_MAX_TOKENS))
+        except Exception as e:
+            print(f"Error embedding content for cache: {str(e)}")
+            return None
+    
+    def generate_flashcards_batch(self, contents: List[str], subject: str = "General",
+                                  num_flashcards: int = 15, difficulty: str = "Mixed") -> List[List[Dict[str, Any]]]:
+        """
+        Generate a deck for each content string, issuing the requests concurrently
         
-        subject_guidance = {
-            "Biology": "Focus on biological processes, organisms, anatomy, and scientific principles.",
-            "Chemistry": "Emphasize chemical reactions, formulas, periodic table, and laboratory concepts.",
-            "Physics": "Concentrate on laws, formulas, phenomena, and problem-solving concepts.",
-            "History": "Include dates, events, causes and effects, and historical significance.",
-            "Literature": "Focus on themes, characters, literary devices, and analysis.",
-            "Mathematics": "Include formulas, theorems, problem-solving steps, and mathematical concepts.",
-            "Computer Science": "Emphasize algorithms, data structures, programming concepts, and technical definitions.",
-            "Psychology": "Focus on theories, terminology, research methods, and psychological phenomena.",
-            "Economics": "Include economic principles, theories, market concepts, and terminology.",
-            "General": "Create well-rounded questions covering key concepts and important information."
+        Args:
+            contents: Educational text contents, one per deck
+            subject: Subject type for optimized prompting
+            num_flashcards: Number of flashcards to generate per deck
+            difficulty: Difficulty level (Easy, Medium, Hard, Mixed)
+        
+        Returns:
+            List of decks in the same order as contents
+        """
+        return self._map_concurrently(
+            lambda content: self.generate_flashcards(content, subject, num_flashcards, difficulty),
+            contents
+        )
+    
+    def _generate_from_chunks(self, chunks: List[str], subject: str,
+                              num_flashcards: int, difficulty: str) -> List[Dict[str, Any]]:
+        """Spread the requested cards across content chunks and generate them in parallel"""
+        return self._generate_from_jobs(self._chunk_jobs(chunks, num_flashcards), subject, num_flashcards, difficulty)
+    
+    def _generate_from_jobs(self, jobs: List[tuple[str, int]], subject: str,
+                            num_flashcards: int, difficulty: str) -> List[Dict[str, Any]]:
+        """Generate each (chunk, card count) job, in parallel when there are several"""
+        if len(jobs) == 1:
+            return self._generate_from_chunk(jobs[0][0], subject, num_flashcards, difficulty)
+        
+        results = self._map_concurrently(
+            lambda job: self._generate_from_chunk(job[0], subject, job[1], difficulty),
+            jobs
+        )
+        flashcards = [card for cards in results for card in cards]
+        
+        return flashcards[:num_flashcards]
+    
+    def _chunk_jobs(self, chunks: List[str], num_flashcards: int) -> List[tuple[str, int]]:
+        """Pair each chunk with its share of the cards: at least one, more for larger chunks"""
+        if len(chunks) > num_flashcards:
+            # Merge neighbouring chunks rather than leave the surplus without cards
+            bounds = [len(chunks) * i // num_flashcards for i in range(num_flashcards + 1)]
+            chunks = [" ".join(chunks[start:end]) for start, end in zip(bounds, bounds[1:])]
+        
+        # One card each, then the rest in proportion to chunk size (largest remainder first),
+        # so a short tail chunk isn't asked for as many cards as a full one
+        token_counts = count_tokens_batch(chunks)
+        total_tokens = sum(token_counts) or 1
+        spare = num_flashcards - len(chunks)
+        shares = [spare * tokens / total_tokens for tokens in token_counts]
+        counts = [1 + math.floor(share) for share in shares]
+        by_remainder = sorted(range(len(chunks)), key=lambda i: shares[i] - math.floor(shares[i]), reverse=True)
+        for i in by_remainder[:num_flashcards - sum(counts)]:
+            counts[i] += 1
+        
+        return list(zip(chunks, counts))
+    
+    def _cached_flashcards(self, jobs: List[tuple[str, int]], subject: str,
+                           difficulty: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the deck from the prompt cache if every job's response is cached, otherwise None"""
+        flashcards = []
+        for chunk, count in jobs:
+            cached = self.cache.get(self._cache_key(self._create_prompt(chunk, subject, count, difficulty)))
+            if cached is None:
+                return None
+            flashcards.extend(cached)
+        return flashcards
+    
+    def _generate_from_chunk(self, content: str, subject: str,
+                             num_flashcards: int, difficulty: str) -> List[Dict[str, Any]]:
+        """Generate flashcards for content that fits in a single request"""
+        prompt = self._create_prompt(content, subject, num_flashcards, difficulty)
+        cache_key = self._cache_key(prompt)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = self._parse_completion(**self._generation_request(prompt, FlashcardDeck))
+        except BadRequestError as e:
+            if "context_length_exceeded" not in str(e):
+                raise
+            # Halve the chunk budget and retry on the smaller pieces
+            chunks = split_text_by_tokens(content, max(1, count_tokens(content) // 2))
+            # A single card would merge the pieces straight back into this chunk
+            if len(chunks) <= 1 or num_flashcards < 2:
+                raise
+            return self._generate_from_chunks(chunks, subject, num_flashcards, difficulty)
+        
+        message = response.choices[0].message
+        if message.parsed is None:
+            raise ValueError(message.refusal or "Empty response from OpenAI")
+        flashcards = self._collect_flashcards(
+            [card.model_dump() for card in message.parsed.flashcards], subject, num_flashcards, difficulty
+        )
+        # A short deck isn't cached, so generating again gets a fresh attempt
+        if len(flashcards) == num_flashcards:
+            self.cache.set(cache_key, flashcards, expire=CACHE_EXPIRE_SECONDS)
+        return flashcards
+    
+    def _cache_key(self, prompt: str) -> str:
+        """Key cached responses by model and prompt"""
+        return hashlib.blake2b((self.model + prompt).encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _generation_request(self, prompt: str, response_format: Any = None) -> Dict[str, Any]:
+        """
+        Build the chat completion parameters for a flashcard generation prompt
+        
+        Args:
+            prompt: Generation prompt
+            response_format: Pydantic model for structured outputs; plain JSON mode if omitted
+        
+        Returns:
+            Keyword arguments for the chat completions API
+        """
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are an expert educational content creator specializing in generating high-quality flashcards for learning and retention."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "response_format": response_format or {"type": "json_object"},
+            "temperature": 0.7,
+            "max_tokens": 3000
         }
+    
+    def _parse_flashcards(self, response_content: Optional[str], subject: str,
+                          num_flashcards: int, difficulty: str) -> List[Dict[str, Any]]:
+        """Parse and validate the flashcards in a generation response"""
+        if response_content is None:
+            raise ValueError("Empty response from OpenAI")
+        result = _json_loads(response_content)
         
-        prompt = f"""
-You are tasked with creating {num_flashcards} high-quality educational flashcards from the provided content.
-
-SUBJECT: {subject}
-DIFFICULTY LEVEL: {difficulty}
-INSTRUCTIONS: {difficulty_instructions.get(difficulty, difficulty_instructions["Mixed"])}
-SUBJECT GUIDANCE: {subject_guidance.get(subject, subject_guidance["General"])}
-
-CONTENT TO PROCESS:
-{content}
-
-REQUIREMENTS:
-1. Generate exactly {num_flashcards} flashcards
-2. Each flashcard must have a clear, specific question and a comprehensive answer
-3. Questions should test understanding, not just memorization
-4. Answers should be complete and self-contained (no references to "the text above")
-5. Focus on the most important concepts and information
-6. Ensure factual accuracy and educational value
-7. Vary question types (definition, application, analysis, comparison, etc.)
-8. If the content allows, distribute questions across different topics/sections
-
-RESPONSE FORMAT:
-Respond with a JSON object containing a "flashcards" array. Each flashcard should have:
-- "question": A clear, specific question
-- "answer": A comprehensive, accurate answer
-- "difficulty": The difficulty level of this specific question
-- "topic": The specific topic or concept this flashcard covers
-
-Example format:
-{{
-  "flashcards": [
-    {{
-      "question": "What is photosynthesis and why is it important for life on Earth?",
-      "answer": "Photosynthesis is the process by which plants convert light energy into chemical energy, producing glucose and oxygen from carbon dioxide and water. It's crucial because it provides oxygen for most life forms and forms the base of most food chains.",
-      "difficulty": "Medium",
-      "topic": "Plant Biology"
-    }}
-  ]
-}}
-
-Generate the flashcards now:
-"""
-        return prompt
+        if "flashcards" in result and isinstance(result["flashcards"], list):
+            return self._collect_flashcards(result["flashcards"], subject, num_flashcards, difficulty)
+        else:
+            raise ValueError("Invalid response format from OpenAI")
+    
+    def _collect_flashcards(self, cards: List[Dict[str, Any]], subject: str,
+                            num_flashcards: int, difficulty: str) -> List[Dict[str, Any]]:
+        """Keep cards that pass validation, normalized and capped at the requested number"""
+        flashcards = [
+            self._normalize_flashcard(card, subject, difficulty)
+            for card in cards
+            if self._validate_flashcard(card)
+        ]
+        
+        return flashcards[:num_flashcards]  # Ensure we don't exceed requested number
+    
+    def _normalize_flashcard(self, card: Dict[str, Any], subject: str, difficulty: str) -> Dict[str, Any]:
+        """Strip a validated card's text and fill in missing metadata"""
+        return {
+            "question": card["question"].strip(),
+            "answer": card["answer"].strip(),
+            "difficulty": card.get("difficulty", difficulty),
+            "topic": card.get("topic", subject)
+        }
+    
+    def _create_prompt(self, content: str, subject: str, num_flashcards: int, difficulty: str) -> str:
+        """Create an optimized prompt for flashcard generation"""
+        return _PROMPT_TEMPLATE.format_map({
+            "num_flashcards": num_flashcards,
+            "subject": subject,
+            "difficulty": difficulty,
+            "difficulty_instructions": _DIFFICULTY_INSTRUCTIONS.get(difficulty, _DIFFICULTY_INSTRUCTIONS["Mixed"]),
+            "subject_guidance": _SUBJECT_GUIDANCE.get(subject, _SUBJECT_GUIDANCE["General"]),
+            "content": content
+        })
     
     def _validate_flashcard(self, card: Dict) -> bool:
         """Validate that a flashcard has required fields and content"""
-        required_fields = ["question", "answer"]
-        
-        for field in required_fields:
-            if field not in card or not card[field] or len(card[field].strip()) < 10:
-                return False
-        
-        # Additional validation
-        if len(card["question"]) > 500 or len(card["answer"]) > 1000:
+        try:
+            _validate_flashcard_schema(card)
+            return True
+        except fastjsonschema.JsonSchemaException:
             return False
-            
-        return True
     
     def enhance_flashcard(self, question: str, answer: str, subject: str) -> Dict[str, str]:
         """Enhance a single flashcard with better formatting and additional context"""
@@ -242,8 +675,12 @@ Respond in JSON format:
   "enhanced_answer": "improved answer here"
 }}
 """
+            cache_key = self._cache_key(prompt)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
             
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model=self.model,
                 messages=[
                     {
@@ -263,13 +700,187 @@ Respond in JSON format:
             enhance_content = response.choices[0].message.content
             if not enhance_content:
                 raise ValueError("Empty response from OpenAI")
-            result = json.loads(enhance_content)
-            return {
+            result = _json_loads(enhance_content)
+            enhanced = {
                 "question": result.get("enhanced_question", question),
                 "answer": result.get("enhanced_answer", answer)
             }
+            self.cache.set(cache_key, enhanced, expire=CACHE_EXPIRE_SECONDS)
+            return enhanced
             
         except Exception as e:
             print(f"Error enhancing flashcard: {str(e)}")
             return {"question": question, "answer": answer}
+    
+    def enhance_flashcards(self, flashcards: List[Dict[str, Any]], subject: str) -> List[Dict[str, str]]:
+        """Enhance several flashcards concurrently, returning results in input order"""
+        return self._map_concurrently(
+            lambda card: self.enhance_flashcard(card["question"], card["answer"], subject),
+            flashcards
+        )
+    
+    def enhance_flashcards_bulk(self, flashcards: List[Dict[str, Any]], subject: str) -> List[Dict[str, str]]:
+        """Enhance several flashcards with a single request, returning results in input order"""
+        originals = [{"question": card["question"], "answer": card["answer"]} for card in flashcards]
+        if not originals:
+            return []
+        
+        try:
+            items = json.dumps([
+                {"id": i, "question": card["question"], "answer": card["answer"]}
+                for i, card in enumerate(originals)
+            ], indent=2)
+            prompt = f"""
+Improve each of the following flashcards for the subject '{subject}':
+
+{items}
+
+Please enhance every flashcard by:
+1. Making the question more specific and clear
+2. Improving the answer with better structure and completeness
+3. Ensuring educational value and accuracy
+
+Respond in JSON format, with one result per flashcard using its original id:
+{{
+  "results": [
+    {{
+      "id": 0,
+      "enhanced_question": "improved question here",
+      "enhanced_answer": "improved answer here"
+    }}
+  ]
+}}
+"""
+            
+            response = self._create_completion(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are an expert educational content editor focused on improving learning materials."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.5,
+                max_tokens=min(500 * len(originals), 16000)
+            )
+            
+            enhance_content = response.choices[0].message.content
+            if not enhance_content:
+                raise ValueError("Empty response from OpenAI")
+            result = _json_loads(enhance_content)
+            
+            # Cards the model skipped or mangled keep their original text
+            enhanced = [dict(card) for card in originals]
+            for item in result.get("results", []):
+                index = item.get("id")
+                if isinstance(index, int) and 0 <= index < len(enhanced):
+                    enhanced[index] = {
+                        "question": item.get("enhanced_question", originals[index]["question"]),
+                        "answer": item.get("enhanced_answer", originals[index]["answer"])
+                    }
+            return enhanced
+            
+        except Exception as e:
+            print(f"Error enhancing flashcards: {str(e)}")
+            return originals
+
 
+class BatchFlashcardGenerator(FlashcardGenerator):
+    """Generate many decks through the OpenAI Batch API for latency-tolerant bulk jobs"""
+    
+    def submit(self, contents: List[str], subject: str = "General",
+               num_flashcards: int = 15, difficulty: str = "Mixed") -> str:
+        """
+        Submit one generation request per content string as an offline batch
+        
+        Args:
+            contents: Educational text contents, one per deck
+            subject: Subject type for optimized prompting
+            num_flashcards: Number of flashcards to generate per deck
+            difficulty: Difficulty level (Easy, Medium, Hard, Mixed)
+        
+        Returns:
+            Batch ID to pass to poll()
+        """
+        # Documents are tokenized together; only the oversized ones are re-encoded to truncate
+        contents = [
+            truncate_to_tokens(content, MAX_CONTENT_TOKENS) if tokens > MAX_CONTENT_TOKENS else content
+            for content, tokens in zip(contents, count_tokens_batch(contents))
+        ]
+        
+        lines = [
+            json.dumps({
+                "custom_id": f"deck-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._generation_request(
+                    self._create_prompt(content, subject, num_flashcards, difficulty)
+                )
+            })
+            for i, content in enumerate(contents)
+        ]
+        
+        batch_file = self.client.files.create(
+            file=("flashcard_batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        # Generation settings travel with the batch so poll() can parse results on its own
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={
+                "deck_count": str(len(contents)),
+                "subject": subject,
+                "num_flashcards": str(num_flashcards),
+                "difficulty": difficulty
+            }
+        )
+        return batch.id
+    
+    def poll(self, batch_id: str) -> Optional[List[List[Dict[str, Any]]]]:
+        """
+        Fetch the results of a submitted batch
+        
+        Args:
+            batch_id: ID returned by submit()
+        
+        Returns:
+            Decks in submission order once the batch has completed, otherwise None.
+            Decks whose request failed are empty.
+        """
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in ("failed", "expired", "cancelled"):
+            raise ValueError(f"Batch {batch_id} ended with status '{batch.status}'")
+        if batch.status != "completed":
+            return None
+        
+        metadata = batch.metadata or {}
+        subject = metadata.get("subject", "General")
+        num_flashcards = int(metadata.get("num_flashcards", 15))
+        difficulty = metadata.get("difficulty", "Mixed")
+        decks = [[] for _ in range(int(metadata.get("deck_count", 0)))]
+        
+        if not batch.output_file_id:
+            return decks
+        
+        output = self.client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = _json_loads(line)
+                index = int(record["custom_id"].split("-", 1)[1])
+                body = record["response"]["body"]
+                decks[index] = self._parse_flashcards(
+                    body["choices"][0]["message"]["content"], subject, num_flashcards, difficulty
+                )
+            except Exception as e:
+                print(f"Error parsing batch result: {str(e)}")
+        
+        return decks
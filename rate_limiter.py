@@ -0,0 +1,56 @@
+import threading
+import time
+
+class RateLimiter:
+    """
+    Thread-safe token bucket for requests-per-minute and tokens-per-minute limits,
+    so concurrent calls are admitted at the account's rate instead of hitting 429s
+    """
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        """
+        Args:
+            requests_per_minute: Requests allowed per minute
+            tokens_per_minute: Prompt plus completion tokens allowed per minute
+        """
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self._request_rate = self.request_capacity / 60
+        self._token_rate = self.token_capacity / 60
+        self._lock = threading.Lock()
+        
+        # Buckets start full and refill lazily on each acquire
+        self._requests = self.request_capacity
+        self._tokens = self.token_capacity
+        self._updated = time.monotonic()
+    
+    def acquire(self, tokens: int) -> None:
+        """
+        Block until one request and the given number of tokens are available, then take them
+        
+        Args:
+            tokens: Estimated tokens the request will consume
+        """
+        # A request larger than the bucket could never be admitted, so cap it at a full bucket
+        tokens = min(float(tokens), self.token_capacity)
+        
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self._requests) / self._request_rate,
+                    (tokens - self._tokens) / self._token_rate
+                )
+            time.sleep(wait)
+    
+    def _refill(self) -> None:
+        """Add the capacity earned since the last refill; caller holds the lock"""
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.request_capacity, self._requests + elapsed * self._request_rate)
+        self._tokens = min(self.token_capacity, self._tokens + elapsed * self._token_rate)
@@ -0,0 +1,112 @@
+import copy
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Sequence
+from diskcache import Cache
+
+class SemanticCache:
+    """
+    Cache of generated decks looked up by embedding similarity, so near-duplicate
+    content (the same chapter with small edits) reuses an earlier deck
+    """
+    
+    def __init__(self, cache: Cache, threshold: float = 0.93, max_entries: int = 1000,
+                 key: str = "semantic"):
+        """
+        Args:
+            cache: diskcache store shared by every instance and process
+            threshold: Minimum cosine similarity that counts as a hit
+            max_entries: Oldest entries are dropped beyond this size
+            key: Prefix for the entry keys and their sequence counter
+        """
+        self.cache = cache
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.key = key
+        self._lock = threading.Lock()
+        
+        # Each entry is stored under its own key, numbered by a shared counter, so
+        # adding one never rewrites the others and concurrent writers can't drop entries
+        self._counter_key = f"{key}:count"
+        self._synced = 0
+        self._ids = []
+        self._scopes = []
+        self._decks = []
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+    
+    def lookup(self, embedding: Sequence[float], scope: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find the stored deck most similar to the embedding within the same scope
+        
+        Args:
+            embedding: Embedding of the request content
+            scope: Generation settings the deck must have been produced with
+        
+        Returns:
+            A copy of the matching deck, or None if nothing is similar enough
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            self._sync()
+            candidates = [i for i, s in enumerate(self._scopes) if s == scope]
+            if not candidates:
+                return None
+            similarities = self._vectors[candidates] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            # Decks are edited in place by callers, so never hand out the stored one
+            return copy.deepcopy(self._decks[candidates[best]])
+    
+    def add(self, embedding: Sequence[float], scope: str, flashcards: List[Dict[str, Any]]) -> None:
+        """Store a deck under the embedding of the content it was generated from"""
+        vector = self._normalize(embedding)
+        # One transaction, so a reader never sees the new count without its entry
+        with self.cache.transact():
+            entry_id = self.cache.incr(self._counter_key)
+            self.cache.set(self._entry_key(entry_id), (scope, vector, flashcards))
+            self.cache.delete(self._entry_key(entry_id - self.max_entries))
+        
+        with self._lock:
+            self._sync()
+    
+    def _sync(self) -> None:
+        """Load entries added since the last sync, by this or any other process; caller holds the lock"""
+        latest = self.cache.get(self._counter_key, 0)
+        if latest == self._synced:
+            return
+        if latest < self._synced:
+            # The counter was evicted or the cache cleared; start over from what is on disk
+            self._synced = 0
+            self._ids, self._scopes, self._decks = [], [], []
+            self._vectors = np.empty((0, 0), dtype=np.float32)
+        
+        first = max(self._synced + 1, latest - self.max_entries + 1)
+        vectors = [self._vectors] if len(self._vectors) else []
+        for entry_id in range(first, latest + 1):
+            entry = self.cache.get(self._entry_key(entry_id))
+            if entry is None:
+                continue
+            scope, vector, deck = entry
+            self._ids.append(entry_id)
+            self._scopes.append(scope)
+            self._decks.append(deck)
+            vectors.append(vector[np.newaxis, :])
+        self._synced = latest
+        
+        # Keep only what is still stored on disk
+        keep = next((i for i, entry_id in enumerate(self._ids) if entry_id > latest - self.max_entries), len(self._ids))
+        self._ids = self._ids[keep:]
+        self._scopes = self._scopes[keep:]
+        self._decks = self._decks[keep:]
+        self._vectors = np.vstack(vectors)[keep:] if vectors else self._vectors
+    
+    def _entry_key(self, entry_id: int) -> str:
+        """Cache key of a numbered entry"""
+        return f"{self.key}:{entry_id}"
+    
+    def _normalize(self, embedding: Sequence[float]) -> np.ndarray:
+        """Scale to unit length so a dot product is the cosine similarity"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -1,7 +1,31 @@
-import PyPDF2
 import io
+import math
+import multiprocessing
+import os
+import re
 import streamlit as st
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Optional
+
+# Spawned workers start a fresh interpreter and re-import this module,
+# so smaller PDFs are not worth the cost of starting them
+PARALLEL_PDF_MIN_PAGES = 32
+
+# Tokenizer used by gpt-4o
+TOKEN_ENCODING = "o200k_base"
+
+# Runs of non-whitespace, i.e. what str.split() would return as words
+_WORDS = re.compile(r"\S+")
+
+# A line break plus the whitespace (and blank lines) around it
+_LINE_BREAKS = re.compile(r"[^\S\n]*\n\s*")
+
+# ASCII unit separator for joining fields; text that contains it is handled per field
+_EXPORT_SEPARATOR = "\x1f"
+
+# Zero-width split after sentence-ending punctuation keeps the original whitespace
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])(?=\s)")
 
 def extract_text_from_pdf(uploaded_file) -> str:
     """
@@ -14,14 +38,17 @@ def extract_text_from_pdf(uploaded_file) -> str:
         Extracted text content as string
     """
     try:
-        # Create a PDF reader object
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(uploaded_file.read()))
+        # Both readers take the file object itself, so the PDF is not copied again
+        uploaded_file.seek(0)
         
-        # Extract text from all pages
-        text_content = ""
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            text_content += page.extract_text() + "\n"
+        # MuPDF parses in native code; PyPDF2 is the pure-Python fallback
+        try:
+            import pymupdf
+        except ImportError:
+            text_content = _extract_text_with_pypdf2(uploaded_file)
+        else:
+            with pymupdf.open(stream=uploaded_file, filetype="pdf") as doc:
+                text_content = "\n".join(page.get_text("text") for page in doc)
         
         if not text_content.strip():
             raise ValueError("No text could be extracted from the PDF. The file might be image-based or corrupted.")
@@ -31,6 +58,36 @@ def extract_text_from_pdf(uploaded_file) -> str:
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
 
+def _extract_text_with_pypdf2(pdf_file) -> str:
+    """Extract text from a PDF file object with PyPDF2, spreading page ranges across processes"""
+    # Imported here so sessions that never upload a PDF don't pay for it
+    import PyPDF2
+    
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    page_count = len(pdf_reader.pages)
+    workers = min(os.cpu_count() or 1, page_count)
+    if page_count < PARALLEL_PDF_MIN_PAGES or workers < 2:
+        return "\n".join(page.extract_text() for page in pdf_reader.pages)
+    
+    # Worker processes need the raw bytes; only this path pays for the copy
+    pdf_file.seek(0)
+    pdf_bytes = pdf_file.getvalue() if hasattr(pdf_file, "getvalue") else pdf_file.read()
+    
+    # Contiguous ranges so each worker parses the document only once
+    step = math.ceil(page_count / workers)
+    ranges = [(pdf_bytes, start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    # Spawn rather than fork: forking the multi-threaded Streamlit server is unsafe
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context("spawn")) as executor:
+        return "\n".join(executor.map(_extract_page_range, ranges))
+
+def _extract_page_range(args: tuple) -> str:
+    """Extract text for pages [start, end) of a PDF; runs in a worker process"""
+    import PyPDF2
+    
+    pdf_bytes, start, end = args
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    return "\n".join(pdf_reader.pages[i].extract_text() for i in range(start, end))
+
 def validate_file_type(uploaded_file) -> bool:
     """
     Validate that the uploaded file is of an acceptable type
@@ -60,31 +117,24 @@ def clean_text_content(text: str) -> str:
     if not text:
         return ""
     
-    # Remove excessive whitespace and normalize line breaks
-    lines = text.split('\n')
-    cleaned_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        if line:  # Only keep non-empty lines
-            cleaned_lines.append(line)
-    
-    # Join lines with single spaces, but preserve paragraph breaks
-    cleaned_text = ""
-    for i, line in enumerate(cleaned_lines):
-        cleaned_text += line
-        # Add appropriate spacing
-        if i < len(cleaned_lines) - 1:
-            next_line = cleaned_lines[i + 1]
-            # If the current line ends with punctuation and next line starts with capital
-            # or if current line is short (likely a heading), add double space for paragraph break
-            if (line.endswith('.') or line.endswith('!') or line.endswith('?') or len(line) < 50) and \
-               next_line and next_line[0].isupper():
-                cleaned_text += "\n\n"
-            else:
-                cleaned_text += " "
-    
-    return cleaned_text
+    # One C-level pass strips every line and drops blank ones
+    lines = _LINE_BREAKS.split(text.strip())
+    if not lines[0]:
+        return ""
+    
+    # Join lines with single spaces, but preserve paragraph breaks:
+    # if the current line ends with punctuation or is short (likely a heading)
+    # and the next line starts with a capital, start a new paragraph
+    parts = []
+    for line, next_line in zip(lines, lines[1:]):
+        parts.append(line)
+        if (line[-1] in ".!?" or len(line) < 50) and next_line[0].isupper():
+            parts.append("\n\n")
+        else:
+            parts.append(" ")
+    parts.append(lines[-1])
+    
+    return "".join(parts)
 
 def format_flashcard_for_export(flashcard: dict, format_type: str = "standard") -> dict:
     """
@@ -111,6 +161,65 @@ def format_flashcard_for_export(flashcard: dict, format_type: str = "standard")
     
     return formatted
 
+def transform_fields_bulk(fields: list[str], transform: Callable[[str], str]) -> list[str]:
+    """
+    Apply a string transform to many fields in one pass over their joined text
+    
+    Args:
+        fields: Text fields to transform
+        transform: Function applied to the text, e.g. a chain of str.replace calls;
+            it must not add or remove the separator character
+    
+    Returns:
+        Transformed fields, same as calling transform on each field
+    """
+    transformed = transform(_EXPORT_SEPARATOR.join(fields)).split(_EXPORT_SEPARATOR)
+    if len(transformed) != len(fields):
+        # Some text already contains the separator (or there are no fields), so the split misaligns
+        return [transform(field) for field in fields]
+    return transformed
+
+def _anki_line_breaks(text: str) -> str:
+    """Anki renders HTML, so newlines become <br>"""
+    return text.replace('\n', '<br>')
+
+def format_flashcards_for_export_bulk(flashcards: list[dict], format_type: str = "standard") -> list[dict]:
+    """
+    Format many flashcards for export, replacing newlines across the whole deck at once
+    
+    Args:
+        flashcards: List of flashcard dictionaries
+        format_type: Type of formatting (standard, anki, quizlet)
+    
+    Returns:
+        List of formatted flashcard dictionaries, same as format_flashcard_for_export per card
+    """
+    if format_type != "anki":
+        return [format_flashcard_for_export(card, format_type) for card in flashcards]
+    
+    questions = transform_fields_bulk([card['question'] for card in flashcards], _anki_line_breaks)
+    answers = transform_fields_bulk([card['answer'] for card in flashcards], _anki_line_breaks)
+    return [
+        {**card, 'question': question, 'answer': answer}
+        for card, question, answer in zip(flashcards, questions, answers)
+    ]
+
+def count_words(text: str) -> int:
+    """
+    Count whitespace-separated words without building a list of them
+    
+    Args:
+        text: Text content to analyze
+    
+    Returns:
+        Number of words
+    """
+    return sum(1 for _ in _WORDS.finditer(text))
+
+def _reading_time_for_words(word_count: int) -> int:
+    """Convert a word count to minutes at 200 words per minute (minimum 1 minute)"""
+    return max(1, round(word_count / 200))
+
 def estimate_reading_time(text: str) -> int:
     """
     Estimate reading time for given text (in minutes)
@@ -125,9 +234,7 @@ def estimate_reading_time(text: str) -> int:
     if not text:
         return 0
     
-    word_count = len(text.split())
-    reading_time = max(1, round(word_count / 200))  # Minimum 1 minute
-    return reading_time
+    return _reading_time_for_words(count_words(text))
 
 def get_content_stats(text: str) -> dict:
     """
@@ -147,14 +254,15 @@ def get_content_stats(text: str) -> dict:
             "estimated_reading_time": 0
         }
     
-    paragraphs = [p for p in text.split('\n\n') if p.strip()]
-    words = text.split()
+    # Count once and derive reading time from it rather than re-scanning the text
+    word_count = count_words(text)
+    paragraph_count = sum(1 for p in text.split('\n\n') if p.strip())
     
     return {
         "character_count": len(text),
-        "word_count": len(words),
-        "paragraph_count": len(paragraphs),
-        "estimated_reading_time": estimate_reading_time(text)
+        "word_count": word_count,
+        "paragraph_count": paragraph_count,
+        "estimated_reading_time": _reading_time_for_words(word_count)
     }
 
 def validate_flashcard_content(question: str, answer: str) -> tuple[bool, str]:
@@ -188,3 +296,90 @@ def validate_flashcard_content(question: str, answer: str) -> tuple[bool, str]:
     
     return True, ""
 
+
+@lru_cache(maxsize=1)
+def get_token_encoder():
+    """Load the tiktoken encoder once per process"""
+    import tiktoken
+    return tiktoken.get_encoding(TOKEN_ENCODING)
+
+def count_tokens(text: str) -> int:
+    """
+    Count model tokens in text
+    
+    Args:
+        text: Text content to analyze
+    
+    Returns:
+        Number of tokens
+    """
+    return len(get_token_encoder().encode_ordinary(text))
+
+def count_tokens_batch(texts: list[str]) -> list[int]:
+    """
+    Count model tokens in many texts at once, tokenizing on native threads
+    
+    Args:
+        texts: Text contents to analyze
+    
+    Returns:
+        Number of tokens for each text, in the same order
+    """
+    token_lists = get_token_encoder().encode_ordinary_batch(texts, num_threads=os.cpu_count() or 1)
+    return [len(tokens) for tokens in token_lists]
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text down to at most max_tokens tokens
+    
+    Args:
+        text: Text content to truncate
+        max_tokens: Token budget
+    
+    Returns:
+        The text unchanged if it fits, otherwise its leading max_tokens tokens
+    """
+    encoder = get_token_encoder()
+    tokens = encoder.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoder.decode(tokens[:max_tokens])
+
+def split_text_by_tokens(text: str, max_tokens: int) -> list[str]:
+    """
+    Split text into chunks of at most max_tokens tokens, breaking between sentences
+    
+    Args:
+        text: Text content to split
+        max_tokens: Token budget for each chunk
+    
+    Returns:
+        List of text chunks in their original order
+    """
+    encoder = get_token_encoder()
+    chunks = []
+    current = []
+    current_tokens = 0
+    
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        tokens = encoder.encode_ordinary(sentence)
+        
+        # A single oversized sentence is cut on token boundaries
+        if len(tokens) > max_tokens:
+            if current:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            for start in range(0, len(tokens), max_tokens):
+                chunks.append(encoder.decode(tokens[start:start + max_tokens]))
+            continue
+        
+        if current and current_tokens + len(tokens) > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += len(tokens)
+    
+    if current:
+        chunks.append("".join(current))
+    
+    return [chunk.strip() for chunk in chunks if chunk.strip()]